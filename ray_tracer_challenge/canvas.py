@@ -1,13 +1,21 @@
 """Provides a canvas type that contains color pixels at (x,y)-coordinates"""
 
-from typing import Callable
+from __future__ import annotations
+from typing import Any, Callable
 import matplotlib.pyplot as plot
-from ray_tracer_challenge.color import Color, Colors
+import numpy as np
+from numpy.typing import ArrayLike, DTypeLike, NDArray
+from ray_tracer_challenge.color import Color
 
 
 class Canvas:
     """Represents a 2D canvas of (x,y) pixels consisting of colors, where the origin (0,0) is at
     the top left, x increases to the right, and y increases down.
+
+    The pixels are stored as a single (height, width, 3) NumPy array of float64 red, green,
+    and blue components, which is exposed without copying through `__array__`,
+    `__array_interface__`, and the buffer protocol, so that NumPy, PIL, OpenCV, and other
+    imaging tools can use the canvas directly.
     """
 
     def __init__(self, width: int, height: int) -> None:
@@ -15,35 +23,92 @@ class Canvas:
         to the color black"""
         self.width = width
         self.height = height
-        self.__array = [[Colors.BLACK.value for _x in range(width)] for _y in range(height)]
+        self.__pixels: NDArray[np.float64] = np.zeros((height, width, 3))
+
+    @classmethod
+    def from_array(cls, array: ArrayLike) -> Canvas:
+        """Creates a canvas that wraps a (height, width, 3) array of red, green, and blue
+        components. A float64 array is wrapped without copying, so writes to the canvas are
+        seen in the array and vice versa. Any other array is copied into a new float64 array,
+        with unsigned integer components, such as 8-bit RGB, scaled from 0 to their dtype's
+        maximum down to 0 to 1. Signed integer components have no such range, so an array of
+        them raises a `ValueError`.
+        """
+        pixels = np.asarray(array)
+        if np.issubdtype(pixels.dtype, np.signedinteger):
+            raise ValueError(f"Expected unsigned integer or float components, got {pixels.dtype}")
+        if np.issubdtype(pixels.dtype, np.unsignedinteger):
+            pixels = pixels / np.iinfo(pixels.dtype).max
+        else:
+            pixels = np.asarray(pixels, dtype=np.float64)
+        if pixels.ndim != 3 or pixels.shape[2] != 3:
+            raise ValueError(f"Expected an array of shape (height, width, 3), got {pixels.shape}")
+        # Bypass __init__ so that no pixel array is allocated only to be replaced
+        canvas = cls.__new__(cls)
+        canvas.width = pixels.shape[1]
+        canvas.height = pixels.shape[0]
+        canvas.__pixels = pixels  # pylint: disable=unused-private-member
+        return canvas
 
     def get_pixel(self, x: int, y: int) -> Color:
         """Get the pixel value at the given (x, y) position"""
-        return self.__array[y][x]
+        return Color(*self.__pixels[y, x].tolist())
 
     def set_pixel(self, x: int, y: int, color: Color) -> None:
         """Set the pixel value at the given (x, y) position"""
-        self.__array[y][x] = color
+        self.__pixels[y, x] = (color.red, color.green, color.blue)
 
     def update_pixels(self, update_fn: Callable[[int, int, Color], Color]) -> None:
         """Updates each pixel in the canvas according to the given function"""
         for x in range(self.width):
             for y in range(self.height):
-                self.__array[y][x] = update_fn(x, y, self.get_pixel(x, y))
+                self.set_pixel(x, y, update_fn(x, y, self.get_pixel(x, y)))
 
-    def show(self) -> None:
-        """Opens an image window and displays the canvas"""
-        # Initialize a new pixel array that we will pass to matplotlib
-        pixel_array = [[[0, 0, 0] for _x in range(self.width)] for _y in range(self.height)]
+    def __array__(self, dtype: DTypeLike | None = None, copy: bool | None = None) -> NDArray[Any]:
+        """Returns the canvas's pixels as a (height, width, 3) array, without copying unless
+        a different dtype or a copy is asked for. Following NumPy 2, a `ValueError` is raised
+        if a copy would be needed but `copy` is `False`. NumPy 1 never passes `copy`, so there
+        `np.array(canvas, copy=False)` copies when it needs to instead of raising.
+        """
+        target = self.__pixels.dtype if dtype is None else np.dtype(dtype)
+        if not copy and target == self.__pixels.dtype:
+            return self.__pixels
+        if copy is False:
+            raise ValueError(f"Converting the canvas's pixels to {target} requires a copy")
+        return self.__pixels.astype(target)
 
-        # For every pixel in the canvas, convert it to an RGB list
-        for x in range(self.width):
-            for y in range(self.height):
-                pixel_array[y][x] = self.get_pixel(x, y).as_rgb_list()
+    @property
+    def __array_interface__(self) -> dict[str, Any]:
+        """Describes the canvas's pixel memory to consumers of the NumPy array interface"""
+        return self.__pixels.__array_interface__
 
+    def __buffer__(self, _flags: int) -> memoryview:
+        """Exposes the canvas's pixel memory through the buffer protocol, as in `memoryview`"""
+        return self.__pixels.data
+
+    def as_rgb_array(self) -> NDArray[np.uint8]:
+        """Converts the canvas to a (height, width, 3) array of 8-bit RGB values, where each
+        individual value runs from 0 to 255 instead of 0 to 1
+        """
+        return (np.clip(self.__pixels, 0.0, 1.0) * 255.0).astype(np.uint8)
+
+    def as_rgb_bytes(
+        self, x: int = 0, y: int = 0, width: int | None = None, height: int | None = None
+    ) -> bytes:
+        """Converts the canvas, or the region of the given width and height whose top left
+        pixel is at (x, y), to packed 8-bit RGB bytes, row by row from the top left, which is
+        the layout most image encoders and viewers accept directly
+        """
+        width = self.width - x if width is None else width
+        height = self.height - y if height is None else height
+        region = self.__pixels[y : y + height, x : x + width]
+        return (np.clip(region, 0.0, 1.0) * 255.0).astype(np.uint8).tobytes()
+
+    def show(self) -> None:
+        """Opens an image window and displays the canvas"""
         # Display the pixel array as an image using matplotlib. Hide all the
         # axis and grid portions of the image.
-        plot.imshow(pixel_array)
+        plot.imshow(self.as_rgb_array())
         plot.grid(False)
         plot.axis("off")
         plot.show()
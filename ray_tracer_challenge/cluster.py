@@ -0,0 +1,432 @@
+"""Distributes the rendering of a single frame across many machines. A coordinator splits the
+canvas into rectangular tiles and hands them out to stateless workers over TCP. Workers send
+heartbeats while rendering, and any tile whose worker disconnects or misses its heartbeats is
+reassigned to another worker. Returned tiles are written straight into the frame buffer.
+
+Workers dial in to the coordinator, so adding capacity is a matter of starting more workers.
+The protocol uses the same newline-delimited JSON headers, each optionally followed by binary
+data, as the render service. After connecting, a worker receives tile assignments, each on a
+single line,
+
+```
+{"tile": <id>, "scene": "projectile", "width": 900, "height": 550,
+ "x": 0, "y": 0, "tile_width": 64, "tile_height": 64}
+```
+
+and replies with `{"heartbeat": true}` lines while rendering, then
+`{"tile": <id>, "size": <n>}` followed by `n` bytes of packed 8-bit RGB pixels, or
+`{"tile": <id>, "error": <message>}` if the tile could not be rendered, which fails the frame.
+
+To render a frame with four workers on the local machine, run:
+```
+poetry run render-cluster --local-workers 4 --output frame.ppm
+```
+
+To add a worker on another machine, run:
+```
+poetry run tile-worker --host <coordinator host> --port 8766
+```
+"""
+
+from __future__ import annotations
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+from typing import Final
+from ray_tracer_challenge.protocol import DEFAULT_HOST, close, send
+from ray_tracer_challenge.render_service import SCENES
+from ray_tracer_challenge.tile_cache import TileCache, tile_key
+
+DEFAULT_PORT: Final[int] = 8766
+DEFAULT_TILE_SIZE: Final[int] = 64
+
+# Workers send a heartbeat at this interval while rendering, and the coordinator reassigns a
+# tile if it has heard nothing from its worker for the heartbeat timeout.
+HEARTBEAT_INTERVAL: Final[float] = 1.0
+HEARTBEAT_TIMEOUT: Final[float] = 5.0
+
+_logger = logging.getLogger(__name__)
+
+# Where `render-cluster` keeps tiles between runs unless told otherwise
+DEFAULT_CACHE_DIRECTORY: Final[str] = os.path.join(
+    os.path.expanduser("~"), ".cache", "ray_tracer_challenge", "tiles"
+)
+
+
+class Tile:
+    """A rectangular region of a canvas, where (x, y) is the tile's top left pixel"""
+
+    def __init__(self, x: int, y: int, width: int, height: int) -> None:
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Tile):
+            return NotImplemented
+        else:
+            return self.bounds == other.bounds
+
+    @property
+    def bounds(self) -> tuple[int, int, int, int]:
+        """The tile's (x, y, width, height)"""
+        return (self.x, self.y, self.width, self.height)
+
+    @property
+    def size(self) -> int:
+        """The number of bytes in the tile's packed RGB pixels"""
+        return self.width * self.height * 3
+
+    def __repr__(self) -> str:
+        return f"Tile({self.x}, {self.y}, {self.width}, {self.height})"
+
+
+def split_into_tiles(width: int, height: int, tile_size: int) -> list[Tile]:
+    """Splits a canvas of the given width and height into square tiles of the given size, in
+    row-major order. Tiles along the right and bottom edges are cropped to fit the canvas.
+    """
+    return [
+        Tile(x, y, min(tile_size, width - x), min(tile_size, height - y))
+        for y in range(0, height, tile_size)
+        for x in range(0, width, tile_size)
+    ]
+
+
+def render_tile(scene: str, width: int, height: int, tile: Tile) -> bytes:
+    """Renders just the given tile of the named scene as packed RGB bytes"""
+    return SCENES[scene].render(width, height, *tile.bounds).as_rgb_bytes()
+
+
+class TileRenderError(RuntimeError):
+    """Raised when a worker reports that it could not render one of a frame's tiles"""
+
+
+class Frame:
+    """A frame being rendered, which owns the buffer that all of its tiles are written into"""
+
+    def __init__(self, scene: str, width: int, height: int, tile_count: int) -> None:
+        self.scene = scene
+        self.width = width
+        self.height = height
+        self.pixels = bytearray(width * height * 3)
+        self.remaining = tile_count
+        self.finished: asyncio.Future[bytearray] = asyncio.get_running_loop().create_future()
+
+    def tile_key(self, tile: Tile) -> str:
+        """The key of one of the frame's tiles in a tile cache"""
+        return tile_key(SCENES[self.scene].description, self.width, self.height, tile.bounds)
+
+    def write_tile(self, tile: Tile, data: bytes) -> None:
+        """Writes a tile's packed RGB bytes into the frame buffer row by row through a memory
+        view, so that the frame is never rebuilt or copied as tiles arrive
+        """
+        if len(data) != tile.size:
+            raise ValueError(f"Expected {tile.size} bytes for {tile}")
+        frame_view = memoryview(self.pixels)
+        tile_view = memoryview(data)
+        row_size = self.width * 3
+        tile_row_size = tile.width * 3
+        for row in range(tile.height):
+            start = (tile.y + row) * row_size + tile.x * 3
+            frame_view[start : start + tile_row_size] = tile_view[
+                row * tile_row_size : (row + 1) * tile_row_size
+            ]
+        self.remaining -= 1
+        if self.remaining == 0 and not self.finished.done():
+            self.finished.set_result(self.pixels)
+
+    def fail(self, error: Exception) -> None:
+        """Fails the frame, unless it has already finished, so that its render raises"""
+        if not self.finished.done():
+            self.finished.set_exception(error)
+
+
+class Coordinator:
+    """Accepts connections from tile workers and distributes the tiles of requested frames
+    among them, reassigning a tile whenever its worker dies or stops sending heartbeats. If
+    given a cache, tiles found in it are written straight into the frame and never sent out.
+    The cache is only used from worker threads, so that its disk access never blocks the event
+    loop.
+    """
+
+    def __init__(
+        self, heartbeat_timeout: float = HEARTBEAT_TIMEOUT, cache: TileCache | None = None
+    ) -> None:
+        self.heartbeat_timeout = heartbeat_timeout
+        self.cache = cache
+        self.__server: asyncio.Server | None = None
+        self.__pending: asyncio.Queue[tuple[Frame, Tile]] = asyncio.Queue()
+        self.__tile_ids = itertools.count()
+        self.__workers: set[asyncio.Task[None]] = set()
+
+    @property
+    def port(self) -> int:
+        """The port the coordinator is listening on, which is useful when started on port 0"""
+        if self.__server is None:
+            raise RuntimeError("The coordinator has not been started")
+        return int(self.__server.sockets[0].getsockname()[1])
+
+    @property
+    def worker_count(self) -> int:
+        """The number of workers currently connected"""
+        return len(self.__workers)
+
+    async def start(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> None:
+        """Begins listening for tile workers"""
+        self.__server = await asyncio.start_server(self.__handle_worker, host, port)
+
+    async def stop(self) -> None:
+        """Disconnects every worker and stops listening"""
+        for worker in self.__workers:
+            worker.cancel()
+        await asyncio.gather(*self.__workers, return_exceptions=True)
+        if self.__server is not None:
+            self.__server.close()
+            await self.__server.wait_closed()
+
+    async def render(
+        self, scene: str, width: int, height: int, tile_size: int = DEFAULT_TILE_SIZE
+    ) -> bytearray:
+        """Renders the named scene across the connected workers and returns the frame as
+        packed RGB bytes, in the same layout as `Canvas.as_rgb_bytes`
+        """
+        if scene not in SCENES:
+            raise ValueError(f"Unknown scene: {scene}")
+        if width <= 0 or height <= 0 or tile_size <= 0:
+            raise ValueError("Width, height, and tile size must be positive")
+        tiles = split_into_tiles(width, height, tile_size)
+        frame = Frame(scene, width, height, len(tiles))
+        if self.cache is None:
+            cached: list[bytes | None] = [None] * len(tiles)
+        else:
+            cached = await asyncio.to_thread(self.__look_up, self.cache, frame, tiles)
+        for tile, data in zip(tiles, cached):
+            if data is None:
+                self.__pending.put_nowait((frame, tile))
+            else:
+                frame.write_tile(tile, data)
+        return await frame.finished
+
+    @staticmethod
+    def __look_up(cache: TileCache, frame: Frame, tiles: list[Tile]) -> list[bytes | None]:
+        """Looks each tile up in the cache. A cached tile of the wrong size, such as from a
+        corrupt file, is evicted and treated as a miss, so that it is rendered again.
+        """
+        return [cache.get(frame.tile_key(tile), tile.size) for tile in tiles]
+
+    async def __handle_worker(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """Feeds tiles to a single worker until it disconnects or misses its heartbeats, in
+        which case its current tile goes back on the queue for another worker
+        """
+        worker = asyncio.current_task()
+        assert worker is not None
+        self.__workers.add(worker)
+        try:
+            while True:
+                frame, tile = await self.__pending.get()
+                # The rest of a failed frame's tiles are not worth rendering
+                if frame.finished.done():
+                    continue
+                try:
+                    data = await self.__assign(reader, writer, frame, tile)
+                except TileRenderError as error:
+                    # The worker is fine, but the tile would fail on any worker. Drop the
+                    # traceback, which runs through this handler, so that whoever catches the
+                    # error from the frame cannot clear the handler's still running frames.
+                    frame.fail(error.with_traceback(None))
+                    continue
+                except asyncio.CancelledError:
+                    self.__pending.put_nowait((frame, tile))
+                    raise
+                except Exception:  # pylint: disable=broad-exception-caught
+                    # The worker disconnected, missed its heartbeats, or replied with something
+                    # malformed, so give its tile to another worker and drop this one
+                    self.__pending.put_nowait((frame, tile))
+                    return
+                if self.cache is not None:
+                    try:
+                        await asyncio.to_thread(self.cache.put, frame.tile_key(tile), data)
+                    except OSError as error:
+                        # The tile is already in the frame, so a full or unwritable disk only
+                        # costs the cache a tile and must not drop a healthy worker
+                        _logger.warning("Could not cache %s: %s", tile, error)
+        except asyncio.CancelledError:
+            # The coordinator is stopping. The server owns this task and does not expect it
+            # to end cancelled, so return normally once the connection is closed.
+            pass
+        finally:
+            self.__workers.discard(worker)
+            await close(writer)
+
+    async def __assign(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, frame: Frame, tile: Tile
+    ) -> bytes:
+        """Sends a tile to a worker and waits, as long as heartbeats keep arriving, for the
+        rendered pixels, which are written into the frame and returned. Raises a
+        `TileRenderError` if the worker could not render the tile and a `ValueError` if its
+        reply is malformed.
+        """
+        tile_id = next(self.__tile_ids)
+        await send(
+            writer,
+            {
+                "tile": tile_id,
+                "scene": frame.scene,
+                "width": frame.width,
+                "height": frame.height,
+                "x": tile.x,
+                "y": tile.y,
+                "tile_width": tile.width,
+                "tile_height": tile.height,
+            },
+        )
+        while True:
+            line = await asyncio.wait_for(reader.readline(), self.heartbeat_timeout)
+            if not line:
+                raise ConnectionResetError("Worker disconnected")
+            message = json.loads(line)
+            if not isinstance(message, dict):
+                raise ValueError(f"Expected a JSON object from the worker, got {message!r}")
+            if message.get("tile") != tile_id:
+                continue
+            if "error" in message:
+                raise TileRenderError(f"Rendering {tile} failed: {message['error']}")
+            # Check the size before reading, so that a bad worker cannot make the
+            # coordinator read an unbounded amount of data
+            if message.get("size") != tile.size:
+                raise ValueError(f"Expected {tile.size} bytes for {tile}, got {message!r}")
+            data = await asyncio.wait_for(reader.readexactly(tile.size), self.heartbeat_timeout)
+            frame.write_tile(tile, data)
+            return data
+
+
+async def run_worker(
+    host: str = DEFAULT_HOST,
+    port: int = DEFAULT_PORT,
+    heartbeat_interval: float = HEARTBEAT_INTERVAL,
+) -> None:
+    """Connects to a coordinator and renders the tiles it assigns until it disconnects. The
+    worker keeps no state between tiles, so any number of them can come and go.
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while line := await reader.readline():
+            assignment = json.loads(line)
+            tile = Tile(
+                assignment["x"],
+                assignment["y"],
+                assignment["tile_width"],
+                assignment["tile_height"],
+            )
+            # Render on a thread so that the event loop remains free to send heartbeats
+            rendering = asyncio.create_task(
+                asyncio.to_thread(
+                    render_tile,
+                    assignment["scene"],
+                    assignment["width"],
+                    assignment["height"],
+                    tile,
+                )
+            )
+            while not (await asyncio.wait({rendering}, timeout=heartbeat_interval))[0]:
+                await send(writer, {"heartbeat": True})
+            try:
+                data = rendering.result()
+            except Exception as error:  # pylint: disable=broad-exception-caught
+                # A failed tile must not take the worker down with it
+                await send(writer, {"tile": assignment["tile"], "error": repr(error)})
+                continue
+            await send(writer, {"tile": assignment["tile"], "size": len(data)}, data)
+    except ConnectionError:
+        pass
+    finally:
+        await close(writer)
+
+
+def _run_worker_process(host: str, port: int) -> None:
+    """Runs a tile worker in its own process until the coordinator disconnects it"""
+    try:
+        asyncio.run(run_worker(host, port))
+    except ConnectionError:
+        # The frame was finished, such as entirely from the cache, before this worker connected
+        pass
+
+
+def write_ppm(path: str, width: int, height: int, pixels: bytes | bytearray) -> None:
+    """Writes packed RGB bytes to a binary PPM image file"""
+    with open(path, "wb") as file:
+        file.write(f"P6\n{width} {height}\n255\n".encode())
+        file.write(pixels)
+
+
+async def render_on_cluster(arguments: argparse.Namespace) -> None:
+    """Starts a coordinator, and optionally some local workers, and renders a single frame"""
+    cache = TileCache(
+        arguments.cache_memory * 1024 * 1024,
+        None if arguments.no_disk_cache else arguments.cache_directory,
+        arguments.cache_disk * 1024 * 1024,
+    )
+    coordinator = Coordinator(arguments.heartbeat_timeout, cache)
+    await coordinator.start(arguments.host, arguments.port)
+    # Spawn rather than fork the local workers, since a forked child would inherit this
+    # process's running event loop
+    context = multiprocessing.get_context("spawn")
+    workers = [
+        context.Process(
+            target=_run_worker_process, args=(arguments.host, coordinator.port), daemon=True
+        )
+        for _ in range(arguments.local_workers)
+    ]
+    for worker in workers:
+        worker.start()
+    print(f"Coordinator listening on {arguments.host}:{coordinator.port}")
+    try:
+        pixels = await coordinator.render(
+            arguments.scene, arguments.width, arguments.height, arguments.tile_size
+        )
+        write_ppm(arguments.output, arguments.width, arguments.height, pixels)
+        print(f"Wrote {arguments.output}")
+        print(f"Tile cache hit rate {cache.statistics.hit_rate:.0%}: {cache.statistics}")
+    finally:
+        await coordinator.stop()
+        for worker in workers:
+            worker.join()
+
+
+def main() -> None:
+    """Entry point for the `render-cluster` Poetry script"""
+    parser = argparse.ArgumentParser(description="Renders a frame across tile workers")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--scene", default="projectile", choices=sorted(SCENES))
+    parser.add_argument("--width", type=int, default=900)
+    parser.add_argument("--height", type=int, default=550)
+    parser.add_argument("--tile-size", type=int, default=DEFAULT_TILE_SIZE)
+    parser.add_argument("--local-workers", type=int, default=0)
+    parser.add_argument("--heartbeat-timeout", type=float, default=HEARTBEAT_TIMEOUT)
+    parser.add_argument("--output", default="frame.ppm")
+    parser.add_argument(
+        "--cache-directory", default=DEFAULT_CACHE_DIRECTORY, help="on-disk tile cache directory"
+    )
+    parser.add_argument(
+        "--no-disk-cache", action="store_true", help="only cache tiles in memory, for this run"
+    )
+    parser.add_argument("--cache-memory", type=int, default=256, help="in-memory cache size in MB")
+    parser.add_argument("--cache-disk", type=int, default=1024, help="on-disk cache size in MB")
+    asyncio.run(render_on_cluster(parser.parse_args()))
+
+
+def worker_main() -> None:
+    """Entry point for the `tile-worker` Poetry script"""
+    parser = argparse.ArgumentParser(description="Renders tiles for a render coordinator")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    arguments = parser.parse_args()
+    asyncio.run(run_worker(arguments.host, arguments.port))
@@ -37,16 +37,51 @@ initial_position = Projectile(Point(0, 1, 0), 11.25 * (Vector(1.0, 1.8, 0).norma
 initial_environment = Environment(Vector(0, -0.1, 0), Vector(-0.01, 0, 0))
 
 
-def run(environment: Environment, initial_position: Projectile, canvas: Canvas) -> None:
+def render(
+    environment: Environment,
+    initial_position: Projectile,
+    canvas: Canvas,
+    origin: tuple[int, int] = (0, 0),
+    frame_height: int | None = None,
+) -> Canvas:
+    # The canvas may be just a region of a larger frame, in which case origin is the frame
+    # pixel at the canvas's top left and frame_height is the height of the whole frame
+    frame_height = canvas.height if frame_height is None else frame_height
     projectile = initial_position
     while tick(environment, projectile).position.y >= 0.0:
         projectile = tick(environment, projectile)
-        canvas.set_pixel(
-            round(projectile.position.x),
-            canvas.height - round(projectile.position.y),
-            Colors.GREEN.value,
-        )
-    canvas.show()
+        x = round(projectile.position.x) - origin[0]
+        y = frame_height - round(projectile.position.y) - origin[1]
+        # Points outside of the canvas are clipped instead of wrapping or raising
+        if 0 <= x < canvas.width and 0 <= y < canvas.height:
+            canvas.set_pixel(x, y, Colors.GREEN.value)
+    return canvas
+
+
+def run(environment: Environment, initial_position: Projectile, canvas: Canvas) -> None:
+    render(environment, initial_position, canvas).show()
+
+
+def render_projectile(
+    width: int, height: int, x: int, y: int, region_width: int, region_height: int
+) -> Canvas:
+    return render(
+        initial_environment,
+        initial_position,
+        Canvas(region_width, region_height),
+        (x, y),
+        height,
+    )
+
+
+def projectile_inputs() -> dict[str, list[int | float]]:
+    # Everything render_projectile draws from besides the frame and region, for cache keys
+    return {
+        "position": initial_position.position.to_tuple_list(),
+        "velocity": initial_position.velocity.to_tuple_list(),
+        "gravity": initial_environment.gravity.to_tuple_list(),
+        "wind": initial_environment.wind.to_tuple_list(),
+    }
 
 
 def projectile() -> None:
@@ -0,0 +1,28 @@
+"""Framing shared by the render service and the render cluster, whose messages are JSON header
+lines, each optionally followed by the binary data the header describes
+"""
+
+import asyncio
+import contextlib
+import json
+from typing import Any, Final
+
+DEFAULT_HOST: Final[str] = "127.0.0.1"
+
+
+async def send(writer: asyncio.StreamWriter, message: dict[str, Any], data: bytes = b"") -> None:
+    """Writes a JSON header line, and any data following it, to the other end. Both are written
+    before yielding to the event loop so that concurrent senders cannot interleave within a
+    message.
+    """
+    writer.write(json.dumps(message).encode() + b"\n")
+    if data:
+        writer.write(data)
+    await writer.drain()
+
+
+async def close(writer: asyncio.StreamWriter) -> None:
+    """Closes a connection and waits for it to close, ignoring the other end having gone"""
+    writer.close()
+    with contextlib.suppress(ConnectionError):
+        await writer.wait_closed()
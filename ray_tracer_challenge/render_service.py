@@ -0,0 +1,364 @@
+"""A long-lived local render service that accepts render jobs over TCP, queues them by
+priority, renders them on a warm process pool, and streams the finished image back in tiles.
+
+The protocol is newline-delimited JSON. A client sends one request per line:
+
+```
+{"scene": "projectile", "width": 900, "height": 550, "priority": 0, "tile_height": 64}
+```
+
+`priority` and `tile_height` are optional, and lower priorities are rendered first. The
+service first replies with `{"job": <id>, "accepted": true}`, and once rendered, it streams
+one header line per tile, `{"job": <id>, "y": <row>, "width": <w>, "height": <h>, "size": <n>}`,
+each immediately followed by `n` bytes of packed 8-bit RGB pixels. A job ends with
+`{"job": <id>, "done": true}` or `{"job": <id>, "error": <message>}`. Several jobs may be
+submitted on one connection, and their tiles may interleave, which is why every line carries
+the job id. A client may half-close the connection once it has sent its requests, and the
+service closes it once every job on it has finished. Closing the connection entirely abandons
+any of its jobs that have not yet been rendered.
+
+Run the service via:
+```
+poetry run render-service --port 8765 --workers 4
+```
+"""
+
+from __future__ import annotations
+import argparse
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import hashlib
+import inspect
+import itertools
+import json
+import os
+import sys
+import types
+from typing import Any, AsyncIterator, Callable, Final
+from ray_tracer_challenge.canvas import Canvas
+from ray_tracer_challenge.projectile import projectile_inputs, render_projectile
+from ray_tracer_challenge.protocol import DEFAULT_HOST, close, send
+
+
+def scene_modules(render: Callable[..., Canvas]) -> list[str]:
+    """Finds the modules of this package that a render function draws on, which are its own
+    module and, transitively, every module of the package whose functions, classes, or objects
+    that module uses
+    """
+    package = __name__.partition(".")[0]
+    modules: set[str] = set()
+    pending = [render.__module__]
+    while pending:
+        name = pending.pop()
+        if name in modules or name.partition(".")[0] != package:
+            continue
+        modules.add(name)
+        for value in vars(sys.modules[name]).values():
+            if isinstance(value, types.ModuleType):
+                pending.append(value.__name__)
+            elif isinstance(module := getattr(value, "__module__", None), str):
+                pending.append(module)
+    return sorted(modules)
+
+
+class Scene:  # pylint: disable=too-few-public-methods
+    """A scene a client may request by name. Its render function takes the (width, height) of
+    the whole frame and the (x, y, width, height) of a region of it and returns a canvas of just
+    that region, so that a frame can be split up and rendered in pieces. Its inputs are the
+    parameters the render function draws on. Both are part of the keys of cached tiles, along
+    with a hash of the source of every module the render function draws on, so that changing
+    the rendering code invalidates the cached tiles without anyone having to remember to. The
+    version only needs to be increased for changes the source hash cannot see, such as to a
+    dependency outside of this package.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        render: Callable[[int, int, int, int, int, int], Canvas],
+        version: int = 1,
+        inputs: dict[str, Any] | None = None,
+    ) -> None:
+        self.name = name
+        self.render = render
+        self.version = version
+        self.inputs = inputs or {}
+        source = hashlib.sha256()
+        for module in scene_modules(render):
+            source.update(inspect.getsource(sys.modules[module]).encode())
+        self.source = source.hexdigest()
+
+    @property
+    def description(self) -> dict[str, Any]:
+        """Everything that determines what the scene draws, in a form that can be hashed"""
+        return {
+            "name": self.name,
+            "version": self.version,
+            "inputs": self.inputs,
+            "source": self.source,
+        }
+
+
+# The scenes a client may request by name. Only the name is sent to the worker processes, which
+# look the scene up here themselves.
+SCENES: Final[dict[str, Scene]] = {
+    "projectile": Scene("projectile", render_projectile, 1, projectile_inputs()),
+}
+
+DEFAULT_PORT: Final[int] = 8765
+DEFAULT_TILE_HEIGHT: Final[int] = 64
+
+# The most pixels a job may ask for. Rendering takes about 30 bytes per pixel at its peak, for
+# the float64 canvas and its 8-bit copies, so a 4096 by 4096 frame, the largest allowed, was
+# measured at about 550 MB for a worker. This keeps a single request from exhausting a worker's
+# memory, which would break the pool for every other job.
+MAX_PIXELS: Final[int] = 4096 * 4096
+
+
+def render_scene(scene: str, width: int, height: int) -> bytes:
+    """Renders the named scene and returns it as packed RGB bytes. This runs inside a worker
+    process, so only the encoded bytes, and not the canvas, are sent back to the service.
+    """
+    return SCENES[scene].render(width, height, 0, 0, width, height).as_rgb_bytes()
+
+
+def _warm_up() -> int:
+    """A no-op job used to force the pool to start its worker processes, with every module
+    imported, before the first real job arrives
+    """
+    return os.getpid()
+
+
+class RenderJob:  # pylint: disable=too-few-public-methods,too-many-instance-attributes
+    """A single render request along with the connection its tiles are streamed to"""
+
+    def __init__(self, job_id: int, request: dict[str, Any], writer: asyncio.StreamWriter) -> None:
+        """Creates a job from a decoded request, raising a `KeyError`, `TypeError`, or
+        `ValueError` if the request is malformed
+        """
+        self.job_id = job_id
+        self.scene = str(request["scene"])
+        self.width = int(request["width"])
+        self.height = int(request["height"])
+        self.priority = int(request.get("priority", 0))
+        self.tile_height = int(request.get("tile_height", DEFAULT_TILE_HEIGHT))
+        self.writer = writer
+        # Set once the job has been streamed, has failed, or has been abandoned
+        self.finished = asyncio.Event()
+        if self.scene not in SCENES:
+            raise ValueError(f"Unknown scene: {self.scene}")
+        if self.width <= 0 or self.height <= 0 or self.tile_height <= 0:
+            raise ValueError("Width, height, and tile height must be positive")
+        if self.width * self.height > MAX_PIXELS:
+            raise ValueError(f"Width times height must be at most {MAX_PIXELS} pixels")
+
+
+class RenderService:
+    """Accepts render jobs over a local TCP socket and renders them on a pool of worker
+    processes that stay alive, and keep their modules imported, for the life of the service
+    """
+
+    def __init__(self, workers: int | None = None) -> None:
+        self.workers = workers or os.cpu_count() or 1
+        self.__pool: ProcessPoolExecutor | None = None
+        self.__server: asyncio.Server | None = None
+        self.__dispatchers: list[asyncio.Task[None]] = []
+        self.__clients: set[asyncio.Task[None]] = set()
+        # Entries are (priority, sequence, job). The sequence number keeps jobs of equal
+        # priority in first in, first out order and means jobs themselves are never compared.
+        self.__queue: asyncio.PriorityQueue[tuple[int, int, RenderJob]] = asyncio.PriorityQueue()
+        self.__job_ids = itertools.count()
+
+    @property
+    def port(self) -> int:
+        """The port the service is listening on, which is useful when started on port 0"""
+        if self.__server is None:
+            raise RuntimeError("The render service has not been started")
+        return int(self.__server.sockets[0].getsockname()[1])
+
+    async def start(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> None:
+        """Starts the worker pool, waits for every worker to be ready, and begins listening"""
+        self.__pool = ProcessPoolExecutor(max_workers=self.workers)
+        await self.__warm_up(self.__pool)
+        self.__dispatchers = [asyncio.create_task(self.__dispatch()) for _ in range(self.workers)]
+        self.__server = await asyncio.start_server(self.__handle_client, host, port)
+
+    async def stop(self) -> None:
+        """Stops listening, cancels any queued jobs, and shuts down the worker pool"""
+        if self.__server is not None:
+            self.__server.close()
+        for dispatcher in self.__dispatchers:
+            dispatcher.cancel()
+        await asyncio.gather(*self.__dispatchers, return_exceptions=True)
+        # Abandon the queued jobs so that their connections are closed
+        while not self.__queue.empty():
+            _priority, _sequence, job = self.__queue.get_nowait()
+            job.finished.set()
+        for client in self.__clients:
+            client.cancel()
+        await asyncio.gather(*self.__clients, return_exceptions=True)
+        if self.__server is not None:
+            await self.__server.wait_closed()
+        if self.__pool is not None:
+            self.__pool.shutdown(cancel_futures=True)
+
+    async def __warm_up(self, pool: ProcessPoolExecutor) -> None:
+        """Waits for every worker in the pool to be started and ready"""
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(pool, _warm_up) for _ in range(self.workers)))
+
+    async def __restart_pool(self, broken: ProcessPoolExecutor) -> None:
+        """Replaces a pool that broke because one of its workers died. Every dispatcher using
+        the pool sees it break, but only the first to get here replaces it, since the new pool
+        is in place before anything is awaited.
+        """
+        if self.__pool is broken:
+            broken.shutdown(wait=False, cancel_futures=True)
+            self.__pool = ProcessPoolExecutor(max_workers=self.workers)
+            await self.__warm_up(self.__pool)
+
+    async def serve_forever(self) -> None:
+        """Serves requests until the task is cancelled"""
+        if self.__server is None:
+            raise RuntimeError("The render service has not been started")
+        try:
+            await self.__server.serve_forever()
+        finally:
+            await self.stop()
+
+    async def __handle_client(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """Reads render requests from a client connection and queues them. Once the client has
+        no more requests, the connection is kept open until all of its jobs have finished.
+        """
+        client = asyncio.current_task()
+        assert client is not None
+        self.__clients.add(client)
+        jobs: list[RenderJob] = []
+        try:
+            while line := await reader.readline():
+                job_id = next(self.__job_ids)
+                try:
+                    job = RenderJob(job_id, json.loads(line), writer)
+                except (KeyError, TypeError, ValueError) as error:
+                    await send(writer, {"job": job_id, "error": str(error)})
+                    continue
+                await send(writer, {"job": job_id, "accepted": True})
+                jobs = [pending for pending in jobs if not pending.finished.is_set()] + [job]
+                await self.__queue.put((job.priority, job_id, job))
+            await asyncio.gather(*(job.finished.wait() for job in jobs))
+        except ConnectionError:
+            pass
+        except asyncio.CancelledError:
+            # The service is stopping. The server owns this task and does not expect it to end
+            # cancelled, so return normally once the connection is closed.
+            pass
+        finally:
+            self.__clients.discard(client)
+            writer.close()
+
+    async def __dispatch(self) -> None:
+        """Takes jobs off the queue in priority order, renders them on the worker pool, and
+        streams the result back to the requesting client
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            _priority, _sequence, job = await self.__queue.get()
+            try:
+                # Skip jobs whose client has already gone away
+                if job.writer.is_closing():
+                    continue
+                pool = self.__pool
+                try:
+                    pixels = await loop.run_in_executor(
+                        pool, render_scene, job.scene, job.width, job.height
+                    )
+                except BrokenProcessPool:
+                    # A worker died, which fails every job in the pool, not just the one that
+                    # killed it. Replace the pool so that later jobs can still be rendered, and
+                    # retry this job on its own, where it can only take itself down.
+                    assert pool is not None
+                    await self.__restart_pool(pool)
+                    pixels = await _render_isolated(job)
+                await _send_tiles(job, pixels)
+            except ConnectionError:
+                pass
+            except Exception as error:  # pylint: disable=broad-exception-caught
+                # A failed render must not take the dispatcher down with it
+                try:
+                    await send(job.writer, {"job": job.job_id, "error": repr(error)})
+                except ConnectionError:
+                    pass
+            finally:
+                job.finished.set()
+                self.__queue.task_done()
+
+
+async def _render_isolated(job: RenderJob) -> bytes:
+    """Renders a job in a process of its own, raising `BrokenProcessPool` if the job kills it"""
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        return await asyncio.get_running_loop().run_in_executor(
+            pool, render_scene, job.scene, job.width, job.height
+        )
+
+
+async def _send_tiles(job: RenderJob, pixels: bytes) -> None:
+    """Streams the rendered pixels to the client as horizontal bands of rows"""
+    row_size = job.width * 3
+    for y in range(0, job.height, job.tile_height):
+        tile_height = min(job.tile_height, job.height - y)
+        tile = pixels[y * row_size : (y + tile_height) * row_size]
+        header = {
+            "job": job.job_id,
+            "y": y,
+            "width": job.width,
+            "height": tile_height,
+            "size": len(tile),
+        }
+        await send(job.writer, header, tile)
+    await send(job.writer, {"job": job.job_id, "done": True})
+
+
+async def request_render(
+    request: dict[str, Any], host: str = DEFAULT_HOST, port: int = DEFAULT_PORT
+) -> AsyncIterator[tuple[int, int, bytes]]:
+    """Submits a single render request, in the same form as a protocol request line, to a
+    running service and yields each tile as a tuple of (y, tile height, RGB bytes) as it arrives
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        await send(writer, request)
+        while True:
+            message = json.loads(await reader.readline())
+            if "error" in message:
+                raise RuntimeError(message["error"])
+            if message.get("done"):
+                return
+            if "size" in message:
+                data = await reader.readexactly(message["size"])
+                yield message["y"], message["height"], data
+    finally:
+        await close(writer)
+
+
+async def serve(host: str, port: int, workers: int | None) -> None:
+    """Starts a render service and serves requests until cancelled"""
+    service = RenderService(workers)
+    await service.start(host, port)
+    print(f"Render service listening on {host}:{service.port} with {service.workers} workers")
+    await service.serve_forever()
+
+
+def main() -> None:
+    """Entry point for the `render-service` Poetry script"""
+    parser = argparse.ArgumentParser(description="Runs the local render service")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=None)
+    arguments = parser.parse_args()
+    try:
+        asyncio.run(serve(arguments.host, arguments.port, arguments.workers))
+    except KeyboardInterrupt:
+        pass
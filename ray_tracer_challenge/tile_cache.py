@@ -0,0 +1,261 @@
+"""A content-addressed cache of rendered tiles, so that re-rendering a frame only renders the
+tiles whose inputs have changed. Tiles are keyed by a stable hash of the scene inputs and the
+tile's bounds and are held in an in-memory least recently used tier with a byte budget, which
+is backed by an optional on-disk tier that evicts its least recently used tiles by total size.
+"""
+
+from __future__ import annotations
+from collections import OrderedDict
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+from typing import Any, Final
+
+# Tile files are named by their key, a SHA-256 hex digest, and are kept in a shard directory
+# named by the key's first two characters. Files are written under a temporary name first.
+_KEY_PATTERN: Final[re.Pattern[str]] = re.compile(r"[0-9a-f]{64}")
+_SHARD_PATTERN: Final[re.Pattern[str]] = re.compile(r"[0-9a-f]{2}")
+_TEMPORARY_SUFFIX: Final[str] = ".partial"
+
+
+def tile_key(
+    scene: dict[str, Any], width: int, height: int, bounds: tuple[int, int, int, int]
+) -> str:
+    """Computes a stable key for a tile from a description of the scene, which must hold
+    everything the scene's rendering depends on, such as its name, version, and parameters,
+    the frame's size, and the tile's (x, y, width, height) bounds. The key is the same across
+    processes and machines, unlike `hash`.
+    """
+    inputs: dict[str, Any] = {"scene": scene, "width": width, "height": height, "tile": bounds}
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+
+
+class CacheStatistics:
+    """Counts of cache lookups and evictions, which are useful in tuning the cache sizes"""
+
+    def __init__(self) -> None:
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.memory_evictions = 0
+        self.disk_evictions = 0
+
+    @property
+    def hits(self) -> int:
+        """The number of lookups found in either tier"""
+        return self.memory_hits + self.disk_hits
+
+    @property
+    def hit_rate(self) -> float:
+        """The fraction of lookups found in either tier, or 0.0 if there have been none"""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def __repr__(self) -> str:
+        return (
+            f"CacheStatistics(memory_hits={self.memory_hits}, disk_hits={self.disk_hits}, "
+            f"misses={self.misses}, memory_evictions={self.memory_evictions}, "
+            f"disk_evictions={self.disk_evictions})"
+        )
+
+
+class MemoryTier:
+    """An in-memory store of tiles that evicts the least recently used tiles to keep the total
+    size of the tile data within a budget
+    """
+
+    def __init__(self, budget: int) -> None:
+        self.budget = budget
+        self.size = 0
+        # Ordered from least to most recently used
+        self.__tiles: OrderedDict[str, bytes] = OrderedDict()
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.__tiles
+
+    def get(self, key: str) -> bytes | None:
+        """Gets a tile's data, or `None` if it is not held"""
+        if (data := self.__tiles.get(key)) is not None:
+            self.__tiles.move_to_end(key)
+        return data
+
+    def remove(self, key: str) -> None:
+        """Removes a tile if it is held"""
+        if (data := self.__tiles.pop(key, None)) is not None:
+            self.size -= len(data)
+
+    def put(self, key: str, data: bytes) -> int:
+        """Adds a tile unless it alone is larger than the budget, returning how many tiles
+        were evicted to make room
+        """
+        if (previous := self.__tiles.pop(key, None)) is not None:
+            self.size -= len(previous)
+        if len(data) > self.budget:
+            return 0
+        self.__tiles[key] = data
+        self.size += len(data)
+        evictions = 0
+        while self.size > self.budget:
+            _key, evicted = self.__tiles.popitem(last=False)
+            self.size -= len(evicted)
+            evictions += 1
+        return evictions
+
+
+class DiskTier:
+    """An on-disk store of tiles, one file per tile, that evicts the least recently used tiles
+    to keep the total size of the files within a budget. Tiles already in the directory, such
+    as from a previous run, are picked up, ordered by when they were last used. Files that are
+    not named and placed like tiles are left alone, except for partially written tiles left
+    behind by a crash, which are removed.
+    """
+
+    def __init__(self, directory: str, budget: int) -> None:
+        self.directory = directory
+        self.budget = budget
+        self.size = 0
+        # Ordered from least to most recently used, mapping each key to its file's size
+        self.__tiles: OrderedDict[str, int] = OrderedDict()
+        os.makedirs(directory, exist_ok=True)
+        entries = []
+        for shard in os.scandir(directory):
+            if not (shard.is_dir() and _SHARD_PATTERN.fullmatch(shard.name)):
+                continue
+            for entry in os.scandir(shard.path):
+                if not (entry.is_file() and entry.name.startswith(shard.name)):
+                    continue
+                if _KEY_PATTERN.fullmatch(entry.name):
+                    entries.append(entry)
+                elif _KEY_PATTERN.match(entry.name) and entry.name.endswith(_TEMPORARY_SUFFIX):
+                    os.remove(entry.path)
+        for entry in sorted(entries, key=lambda entry: entry.stat().st_mtime):
+            self.__tiles[entry.name] = entry.stat().st_size
+            self.size += entry.stat().st_size
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.__tiles
+
+    def get(self, key: str) -> bytes | None:
+        """Gets a tile's data, or `None` if it is not held. Using a tile updates its file's
+        modification time, which is how the least recently used order survives restarts.
+        """
+        if key not in self.__tiles:
+            return None
+        try:
+            with open(self.__path(key), "rb") as file:
+                data = file.read()
+            os.utime(self.__path(key))
+        except FileNotFoundError:
+            # Removed from under us, so treat it as a miss
+            self.size -= self.__tiles.pop(key)
+            return None
+        self.__tiles.move_to_end(key)
+        return data
+
+    def remove(self, key: str) -> None:
+        """Removes a tile if it is held"""
+        if key in self.__tiles:
+            self.size -= self.__tiles.pop(key)
+            try:
+                os.remove(self.__path(key))
+            except FileNotFoundError:
+                pass
+
+    def put(self, key: str, data: bytes) -> int:
+        """Writes a tile unless it alone is larger than the budget, returning how many tiles
+        were evicted to make room. The file is replaced atomically so that a concurrent reader
+        never sees a partially written tile.
+        """
+        if key in self.__tiles:
+            self.size -= self.__tiles.pop(key)
+        if len(data) > self.budget:
+            return 0
+        path = self.__path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        file_descriptor, temporary_path = tempfile.mkstemp(
+            prefix=key, suffix=_TEMPORARY_SUFFIX, dir=os.path.dirname(path)
+        )
+        try:
+            with os.fdopen(file_descriptor, "wb") as file:
+                file.write(data)
+            os.replace(temporary_path, path)
+        except BaseException:
+            # Such as when the disk is full, in which case nothing should be left behind
+            try:
+                os.remove(temporary_path)
+            except FileNotFoundError:
+                pass
+            raise
+        self.__tiles[key] = len(data)
+        self.size += len(data)
+        evictions = 0
+        while self.size > self.budget:
+            evicted, size = self.__tiles.popitem(last=False)
+            self.size -= size
+            evictions += 1
+            try:
+                os.remove(self.__path(evicted))
+            except FileNotFoundError:
+                pass
+        return evictions
+
+    def __path(self, key: str) -> str:
+        """The path of a tile's file, sharded by the first two characters of its key so that
+        no single directory grows too large
+        """
+        return os.path.join(self.directory, key[:2], key)
+
+
+class TileCache:
+    """A two tier cache of rendered tiles. The memory tier holds at most `memory_budget` bytes
+    of tile data. If `directory` is given, every tile is also written to disk, where at most
+    `disk_budget` bytes are kept, and tiles found only on disk are promoted back into memory.
+    The cache may be used from several threads, such as to keep its disk access off of an
+    event loop.
+    """
+
+    def __init__(
+        self, memory_budget: int, directory: str | None = None, disk_budget: int = 1 << 30
+    ) -> None:
+        self.memory = MemoryTier(memory_budget)
+        self.disk = None if directory is None else DiskTier(directory, disk_budget)
+        self.statistics = CacheStatistics()
+        self.__lock = threading.Lock()
+
+    def __contains__(self, key: str) -> bool:
+        with self.__lock:
+            return key in self.memory or (self.disk is not None and key in self.disk)
+
+    def get(self, key: str, size: int | None = None) -> bytes | None:
+        """Gets a tile's data, or `None` if it is in neither tier. If a size is given, data of
+        any other size is treated as corrupt, so it is removed and counted as a miss.
+        """
+        with self.__lock:
+            if (data := self.memory.get(key)) is not None:
+                if size is None or len(data) == size:
+                    self.statistics.memory_hits += 1
+                    return data
+            elif self.disk is not None and (data := self.disk.get(key)) is not None:
+                if size is None or len(data) == size:
+                    self.statistics.disk_hits += 1
+                    self.statistics.memory_evictions += self.memory.put(key, data)
+                    return data
+            if data is not None:
+                self.memory.remove(key)
+                if self.disk is not None:
+                    self.disk.remove(key)
+            self.statistics.misses += 1
+            return None
+
+    def put(self, key: str, data: bytes) -> None:
+        """Adds a tile's data to the cache, evicting least recently used tiles as needed. Raises
+        an `OSError` if the tile could not be written to disk, in which case it is still held
+        in memory.
+        """
+        with self.__lock:
+            self.statistics.memory_evictions += self.memory.put(key, data)
+            if self.disk is not None:
+                self.statistics.disk_evictions += self.disk.put(key, data)
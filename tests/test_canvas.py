@@ -1,4 +1,6 @@
+import sys
 import unittest
+import numpy as np
 from ray_tracer_challenge.canvas import *
 from ray_tracer_challenge.color import *
 
@@ -26,6 +28,81 @@ class TestCanvas(unittest.TestCase):
         self.assertEqual(canvas.get_pixel(8, 10), Colors.BLACK.value)
         self.assertEqual(canvas.get_pixel(9, 19), Colors.BLUE.value)
 
+    def test_converting_a_canvas_to_rgb_bytes(self):
+        canvas = Canvas(2, 2)
+        canvas.set_pixel(1, 0, Colors.RED.value)
+        canvas.set_pixel(0, 1, Color(0.5, 2, -1))
+        self.assertEqual(canvas.as_rgb_bytes(), bytes([0, 0, 0, 255, 0, 0, 127, 255, 0, 0, 0, 0]))
+        self.assertEqual(canvas.as_rgb_bytes(1, 0, 1, 2), bytes([255, 0, 0, 0, 0, 0]))
+
+    def test_converting_a_canvas_to_an_rgb_array(self):
+        canvas = Canvas(2, 1)
+        canvas.set_pixel(1, 0, Color(0.5, 2, -1))
+        rgb = canvas.as_rgb_array()
+        self.assertEqual(rgb.dtype, np.uint8)
+        self.assertEqual(rgb.tolist(), [[[0, 0, 0], [127, 255, 0]]])
+
+    def test_a_canvas_is_an_array_without_copying(self):
+        canvas = Canvas(10, 20)
+        array = np.asarray(canvas)
+        self.assertEqual(array.shape, (20, 10, 3))
+        array[19, 9] = (0, 0, 1)
+        self.assertEqual(canvas.get_pixel(9, 19), Colors.BLUE.value)
+        self.assertTrue(np.shares_memory(np.array(canvas, copy=False), array))
+        self.assertFalse(np.shares_memory(np.array(canvas), array))
+
+    def test_converting_a_canvas_to_another_dtype_without_copying_is_an_error(self):
+        canvas = Canvas(10, 20)
+        self.assertEqual(canvas.__array__(np.float32).dtype, np.float32)
+        with self.assertRaises(ValueError):
+            canvas.__array__(np.float32, copy=False)
+
+    @unittest.skipIf(np.lib.NumpyVersion(np.__version__) < "2.0.0", "NumPy 1 never passes copy")
+    def test_numpy_refuses_to_convert_a_canvas_to_another_dtype_without_copying(self):
+        canvas = Canvas(10, 20)
+        self.assertEqual(np.array(canvas, dtype=np.float32).dtype, np.float32)
+        with self.assertRaises(ValueError):
+            np.array(canvas, dtype=np.float32, copy=False)
+
+    def test_a_canvas_exposes_the_array_interface(self):
+        canvas = Canvas(10, 20)
+        self.assertEqual(canvas.__array_interface__["shape"], (20, 10, 3))
+        self.assertEqual(
+            canvas.__array_interface__["data"], np.asarray(canvas).__array_interface__["data"]
+        )
+
+    @unittest.skipIf(sys.version_info < (3, 12), "Python buffer protocol requires Python 3.12")
+    def test_a_canvas_supports_the_buffer_protocol(self):
+        canvas = Canvas(10, 20)
+        canvas.set_pixel(9, 19, Colors.BLUE.value)
+        view = memoryview(canvas)
+        self.assertEqual(view.shape, (20, 10, 3))
+        self.assertEqual(view[19, 9, 2], 1.0)
+
+    def test_creating_a_canvas_from_an_array_does_not_copy(self):
+        array = np.zeros((20, 10, 3))
+        canvas = Canvas.from_array(array)
+        self.assertEqual(canvas.width, 10)
+        self.assertEqual(canvas.height, 20)
+        canvas.set_pixel(9, 19, Colors.BLUE.value)
+        self.assertEqual(array[19, 9].tolist(), [0, 0, 1])
+        self.assertTrue(np.shares_memory(np.asarray(canvas), array))
+
+    def test_creating_a_canvas_from_an_8_bit_array_scales_the_components(self):
+        array = np.array([[[0, 128, 255]]], dtype=np.uint8)
+        canvas = Canvas.from_array(array)
+        self.assertEqual(canvas.get_pixel(0, 0), Color(0, 128 / 255, 1))
+        self.assertEqual(canvas.as_rgb_bytes(), bytes([0, 128, 255]))
+        self.assertFalse(np.shares_memory(np.asarray(canvas), array))
+
+    def test_creating_a_canvas_from_a_signed_integer_array_is_an_error(self):
+        with self.assertRaises(ValueError):
+            Canvas.from_array(np.array([[[-128, 0, 127]]], dtype=np.int8))
+
+    def test_creating_a_canvas_from_an_array_of_the_wrong_shape_is_an_error(self):
+        with self.assertRaises(ValueError):
+            Canvas.from_array(np.zeros((20, 10)))
+
 
 if __name__ == "__main__":
     unittest.main()
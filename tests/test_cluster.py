@@ -0,0 +1,210 @@
+import asyncio
+import json
+import unittest
+from ray_tracer_challenge.cluster import *
+from ray_tracer_challenge.render_service import SCENES, Scene, render_scene
+from ray_tracer_challenge.tile_cache import TileCache
+
+
+def broken(width, height, x, y, region_width, region_height):
+    raise RuntimeError("bad scene")
+
+
+class FullDiskCache(TileCache):
+    def put(self, key, data):
+        raise OSError("No space left on device")
+
+
+class TestTiles(unittest.TestCase):
+    def test_splitting_a_canvas_into_tiles(self):
+        self.assertEqual(
+            split_into_tiles(5, 3, 2),
+            [
+                Tile(0, 0, 2, 2),
+                Tile(2, 0, 2, 2),
+                Tile(4, 0, 1, 2),
+                Tile(0, 2, 2, 1),
+                Tile(2, 2, 2, 1),
+                Tile(4, 2, 1, 1),
+            ],
+        )
+
+    def test_rendering_a_tile_matches_that_region_of_the_frame(self):
+        pixels = render_scene("projectile", 90, 55)
+        tile = render_tile("projectile", 90, 55, Tile(10, 20, 4, 2))
+        self.assertEqual(
+            tile,
+            pixels[(20 * 90 + 10) * 3 : (20 * 90 + 14) * 3]
+            + pixels[(21 * 90 + 10) * 3 : (21 * 90 + 14) * 3],
+        )
+
+
+class TestCoordinator(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.coordinator = Coordinator(heartbeat_timeout=0.5)
+        await self.coordinator.start(port=0)
+        self.workers = []
+
+    async def asyncTearDown(self):
+        await self.coordinator.stop()
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+
+    async def start_worker(self):
+        connected = self.coordinator.worker_count
+        self.workers.append(
+            asyncio.create_task(run_worker(port=self.coordinator.port, heartbeat_interval=0.1))
+        )
+        while self.coordinator.worker_count <= connected:
+            await asyncio.sleep(0.01)
+
+    async def start_faulty_worker(self, respond):
+        reader, writer = await asyncio.open_connection(DEFAULT_HOST, self.coordinator.port)
+        self.workers.append(asyncio.create_task(respond(reader, writer)))
+        while self.coordinator.worker_count == 0:
+            await asyncio.sleep(0.01)
+
+    async def test_writing_tiles_into_a_frame(self):
+        frame = Frame("projectile", 3, 2, 2)
+        frame.write_tile(Tile(0, 0, 2, 2), bytes(range(12)))
+        self.assertFalse(frame.finished.done())
+        frame.write_tile(Tile(2, 0, 1, 2), bytes([100, 101, 102, 103, 104, 105]))
+        self.assertEqual(
+            await frame.finished,
+            bytes([0, 1, 2, 3, 4, 5, 100, 101, 102, 6, 7, 8, 9, 10, 11, 103, 104, 105]),
+        )
+
+    async def test_rendering_a_frame_across_workers(self):
+        await self.start_worker()
+        await self.start_worker()
+        pixels = await asyncio.wait_for(self.coordinator.render("projectile", 90, 55, 16), 10)
+        self.assertEqual(pixels, render_scene("projectile", 90, 55))
+
+    async def test_tiles_are_reassigned_when_a_worker_dies(self):
+        async def die(reader, writer):
+            await reader.readline()
+            writer.close()
+            await writer.wait_closed()
+
+        await self.start_faulty_worker(die)
+        rendering = asyncio.create_task(self.coordinator.render("projectile", 90, 55, 16))
+        await self.workers[0]
+        while self.coordinator.worker_count > 0:
+            await asyncio.sleep(0.01)
+        await self.start_worker()
+        pixels = await asyncio.wait_for(rendering, 10)
+        self.assertEqual(pixels, render_scene("projectile", 90, 55))
+
+    async def test_tiles_are_reassigned_when_a_worker_misses_heartbeats(self):
+        async def hang(reader, writer):
+            try:
+                await reader.readline()
+                await asyncio.sleep(60)
+            finally:
+                writer.close()
+                await writer.wait_closed()
+
+        await self.start_faulty_worker(hang)
+        rendering = asyncio.create_task(self.coordinator.render("projectile", 90, 55, 16))
+        await asyncio.sleep(0.1)
+        await self.start_worker()
+        pixels = await asyncio.wait_for(rendering, 10)
+        self.assertEqual(pixels, render_scene("projectile", 90, 55))
+        self.assertEqual(self.coordinator.worker_count, 1)
+
+    async def reply_badly(self, reply):
+        async def respond(reader, writer):
+            try:
+                assignment = json.loads(await reader.readline())
+                writer.write(reply(assignment["tile"]) + b"\n")
+                await writer.drain()
+                await reader.read()
+            finally:
+                writer.close()
+                await writer.wait_closed()
+
+        await self.start_faulty_worker(respond)
+        rendering = asyncio.create_task(self.coordinator.render("projectile", 90, 55, 16))
+        while self.coordinator.worker_count > 0:
+            await asyncio.sleep(0.01)
+        await self.start_worker()
+        pixels = await asyncio.wait_for(rendering, 10)
+        self.assertEqual(pixels, render_scene("projectile", 90, 55))
+
+    async def test_tiles_are_reassigned_when_a_worker_replies_without_a_size(self):
+        await self.reply_badly(lambda tile_id: json.dumps({"tile": tile_id}).encode())
+
+    async def test_tiles_are_reassigned_when_a_worker_replies_with_the_wrong_size(self):
+        await self.reply_badly(
+            lambda tile_id: json.dumps({"tile": tile_id, "size": 1 << 40}).encode()
+        )
+
+    async def test_tiles_are_reassigned_when_a_worker_replies_with_a_non_object(
+        self,
+    ):
+        await self.reply_badly(lambda tile_id: b"[1, 2, 3]")
+
+    async def test_a_tile_that_fails_to_render_fails_the_frame(self):
+        SCENES["broken"] = Scene("broken", broken)
+        self.addCleanup(SCENES.pop, "broken")
+        await self.start_worker()
+        await self.start_worker()
+        with self.assertRaisesRegex(TileRenderError, "bad scene"):
+            await asyncio.wait_for(self.coordinator.render("broken", 90, 55, 16), 10)
+        self.assertEqual(self.coordinator.worker_count, 2)
+        pixels = await asyncio.wait_for(self.coordinator.render("projectile", 90, 55, 16), 10)
+        self.assertEqual(pixels, render_scene("projectile", 90, 55))
+
+    async def test_cached_tiles_are_not_rendered_again(self):
+        await self.coordinator.stop()
+        self.coordinator = Coordinator(heartbeat_timeout=0.5, cache=TileCache(1 << 20))
+        await self.coordinator.start(port=0)
+        await self.start_worker()
+        first = await asyncio.wait_for(self.coordinator.render("projectile", 90, 55, 16), 10)
+        await self.coordinator.stop()
+        # With no workers left, the frame can only be rendered from the cache
+        second = await asyncio.wait_for(self.coordinator.render("projectile", 90, 55, 16), 10)
+        self.assertEqual(first, second)
+        self.assertEqual(self.coordinator.cache.statistics.hits, 24)
+        self.assertEqual(self.coordinator.cache.statistics.misses, 24)
+
+    async def test_failing_to_cache_a_tile_does_not_drop_the_worker(self):
+        await self.coordinator.stop()
+        self.coordinator = Coordinator(heartbeat_timeout=0.5, cache=FullDiskCache(1 << 20))
+        await self.coordinator.start(port=0)
+        await self.start_worker()
+        with self.assertLogs("ray_tracer_challenge.cluster", "WARNING"):
+            pixels = await asyncio.wait_for(self.coordinator.render("projectile", 90, 55, 16), 10)
+        self.assertEqual(pixels, render_scene("projectile", 90, 55))
+        self.assertEqual(self.coordinator.worker_count, 1)
+
+    async def test_cached_tiles_of_the_wrong_size_are_rendered_again(self):
+        await self.coordinator.stop()
+        cache = TileCache(1 << 20)
+        frame = Frame("projectile", 90, 55, 1)
+        cache.put(frame.tile_key(Tile(0, 0, 16, 16)), b"too short")
+        self.coordinator = Coordinator(heartbeat_timeout=0.5, cache=cache)
+        await self.coordinator.start(port=0)
+        await self.start_worker()
+        pixels = await asyncio.wait_for(self.coordinator.render("projectile", 90, 55, 16), 10)
+        self.assertEqual(pixels, render_scene("projectile", 90, 55))
+        self.assertEqual(cache.statistics.misses, 24)
+
+    async def test_rendering_an_unknown_scene_is_an_error(self):
+        with self.assertRaises(ValueError):
+            await self.coordinator.render("teapot", 10, 10)
+
+    async def test_rendering_an_empty_frame_is_an_error(self):
+        with self.assertRaises(ValueError):
+            await self.coordinator.render("projectile", 0, 10)
+        with self.assertRaises(ValueError):
+            await self.coordinator.render("projectile", 10, -1)
+
+    async def test_rendering_with_a_tile_size_of_zero_is_an_error(self):
+        with self.assertRaises(ValueError):
+            await self.coordinator.render("projectile", 10, 10, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -28,6 +28,8 @@ class TestColor(unittest.TestCase):
         self.assertEqual(c1 * c2, Color(0.9, 0.2, 0.04))
 
     # Additional tests not in the book
+    def test_converting_a_color_to_an_rgb_list_clamps_each_component(self):
+        self.assertEqual(Color(0.5, 2, -1).as_rgb_list(), [127, 255, 0])
 
     def test_multiplying_colors_is_the_hadamard_product(self):
         c1 = Color(1, 0.2, 0.4)
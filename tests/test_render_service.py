@@ -0,0 +1,124 @@
+import asyncio
+import json
+import multiprocessing
+import os
+import time
+import unittest
+from ray_tracer_challenge.projectile import render_projectile
+from ray_tracer_challenge.render_service import *
+
+
+def crash(width, height, x, y, region_width, region_height):
+    os._exit(1)
+
+
+def slow(width, height, x, y, region_width, region_height):
+    time.sleep(0.5)
+    return render_projectile(width, height, x, y, region_width, region_height)
+
+
+class TestScenes(unittest.TestCase):
+    def test_scenes_are_described_by_the_source_they_draw_on(self):
+        self.assertEqual(
+            scene_modules(render_projectile),
+            [
+                "ray_tracer_challenge.canvas",
+                "ray_tracer_challenge.color",
+                "ray_tracer_challenge.projectile",
+                "ray_tracer_challenge.tuples",
+                "ray_tracer_challenge.utilities",
+            ],
+        )
+        self.assertEqual(len(SCENES["projectile"].description["source"]), 64)
+
+
+class TestRenderService(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.service = RenderService(workers=2)
+        await self.service.start(port=0)
+
+    async def asyncTearDown(self):
+        await self.service.stop()
+
+    async def test_rendering_a_scene_streams_its_tiles(self):
+        request = {"scene": "projectile", "width": 90, "height": 55, "tile_height": 16}
+        tiles = [tile async for tile in request_render(request, port=self.service.port)]
+        self.assertEqual(
+            [(y, height) for y, height, _data in tiles], [(0, 16), (16, 16), (32, 16), (48, 7)]
+        )
+        self.assertEqual(
+            b"".join(data for _y, _height, data in tiles), render_scene("projectile", 90, 55)
+        )
+
+    async def test_requesting_an_unknown_scene_is_an_error(self):
+        request = {"scene": "teapot", "width": 10, "height": 10}
+        with self.assertRaises(RuntimeError):
+            async for _tile in request_render(request, port=self.service.port):
+                pass
+
+    async def test_requesting_too_large_a_canvas_is_an_error(self):
+        request = {"scene": "projectile", "width": MAX_PIXELS // 10 + 1, "height": 10}
+        with self.assertRaises(RuntimeError):
+            async for _tile in request_render(request, port=self.service.port):
+                pass
+
+    async def test_jobs_finish_after_the_client_half_closes(self):
+        reader, writer = await asyncio.open_connection(DEFAULT_HOST, self.service.port)
+        for width in (30, 40):
+            request = {"scene": "projectile", "width": width, "height": 20}
+            writer.write(json.dumps(request).encode() + b"\n")
+        writer.write_eof()
+        done = 0
+        while line := await reader.readline():
+            message = json.loads(line)
+            if "size" in message:
+                await reader.readexactly(message["size"])
+            done += message.get("done", False)
+        writer.close()
+        self.assertEqual(done, 2)
+
+
+@unittest.skipUnless(
+    multiprocessing.get_start_method() == "fork", "Worker processes must inherit the test scene"
+)
+class TestRenderServiceRecovery(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        SCENES["crash"] = Scene("crash", crash)
+        SCENES["slow"] = Scene("slow", slow)
+        self.addCleanup(SCENES.pop, "crash")
+        self.addCleanup(SCENES.pop, "slow")
+        self.service = RenderService(workers=2)
+        await self.service.start(port=0)
+
+    async def asyncTearDown(self):
+        await self.service.stop()
+
+    async def test_the_pool_is_restarted_when_a_worker_dies(self):
+        with self.assertRaises(RuntimeError):
+            async for _tile in request_render(
+                {"scene": "crash", "width": 10, "height": 10}, port=self.service.port
+            ):
+                pass
+        request = {"scene": "projectile", "width": 90, "height": 55}
+        tiles = [tile async for tile in request_render(request, port=self.service.port)]
+        self.assertEqual(
+            b"".join(data for _y, _height, data in tiles), render_scene("projectile", 90, 55)
+        )
+
+    async def test_a_dying_worker_only_fails_its_own_job(self):
+        async def render(scene):
+            request = {"scene": scene, "width": 90, "height": 55}
+            return [tile async for tile in request_render(request, port=self.service.port)]
+
+        slow_job = asyncio.create_task(render("slow"))
+        await asyncio.sleep(0.1)
+        with self.assertRaises(RuntimeError):
+            await render("crash")
+        tiles = await asyncio.wait_for(slow_job, 10)
+        self.assertEqual(
+            b"".join(data for _y, _height, data in tiles), render_scene("projectile", 90, 55)
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+import os
+import tempfile
+import unittest
+from ray_tracer_challenge.tile_cache import *
+
+# Tiles on disk must be named like real keys to be picked up again
+A, B, C = "a" * 64, "b" * 64, "c" * 64
+
+
+class TestTileCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def test_tile_keys_depend_on_the_scene_inputs_and_bounds(self):
+        scene = {"name": "projectile", "version": 1, "inputs": {"wind": [-0.01, 0, 0]}}
+        key = tile_key(scene, 900, 550, (0, 0, 64, 64))
+        self.assertEqual(key, tile_key(dict(scene), 900, 550, (0, 0, 64, 64)))
+        self.assertNotEqual(key, tile_key(scene, 900, 551, (0, 0, 64, 64)))
+        self.assertNotEqual(key, tile_key(scene, 900, 550, (64, 0, 64, 64)))
+        self.assertNotEqual(key, tile_key({**scene, "version": 2}, 900, 550, (0, 0, 64, 64)))
+
+    def test_tile_keys_change_when_a_scene_input_changes(self):
+        scene = {"name": "projectile", "version": 1, "inputs": {"wind": [-0.01, 0, 0]}}
+        windier = {**scene, "inputs": {"wind": [-0.02, 0, 0]}}
+        self.assertNotEqual(
+            tile_key(scene, 900, 550, (0, 0, 64, 64)), tile_key(windier, 900, 550, (0, 0, 64, 64))
+        )
+
+    def test_getting_a_missing_tile_is_a_miss(self):
+        cache = TileCache(100)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.statistics.misses, 1)
+        self.assertEqual(cache.statistics.hit_rate, 0.0)
+
+    def test_the_memory_tier_evicts_the_least_recently_used_tile(self):
+        cache = TileCache(10)
+        cache.put("a", b"aaaa")
+        cache.put("b", b"bbbb")
+        self.assertEqual(cache.get("a"), b"aaaa")
+        cache.put("c", b"cccc")
+        self.assertNotIn("b", cache)
+        self.assertEqual(cache.get("a"), b"aaaa")
+        self.assertEqual(cache.get("c"), b"cccc")
+        self.assertEqual(cache.memory.size, 8)
+        self.assertEqual(cache.statistics.memory_hits, 3)
+        self.assertEqual(cache.statistics.memory_evictions, 1)
+
+    def test_tiles_larger_than_the_memory_budget_are_not_held_in_memory(self):
+        cache = TileCache(2)
+        cache.put("a", b"aaaa")
+        self.assertNotIn("a", cache)
+        self.assertEqual(cache.memory.size, 0)
+
+    def test_tiles_evicted_from_memory_are_found_on_disk(self):
+        cache = TileCache(4, self.directory.name)
+        cache.put(A, b"aaaa")
+        cache.put(B, b"bbbb")
+        self.assertEqual(cache.get(A), b"aaaa")
+        self.assertEqual(cache.statistics.disk_hits, 1)
+        self.assertEqual(cache.get(A), b"aaaa")
+        self.assertEqual(cache.statistics.memory_hits, 1)
+
+    def test_the_disk_tier_persists_across_caches(self):
+        TileCache(100, self.directory.name).put(A, b"aaaa")
+        cache = TileCache(100, self.directory.name)
+        self.assertEqual(cache.disk.size, 4)
+        self.assertEqual(cache.get(A), b"aaaa")
+
+    def test_the_disk_tier_evicts_the_least_recently_used_tile(self):
+        cache = TileCache(0, self.directory.name, 10)
+        cache.put(A, b"aaaa")
+        cache.put(B, b"bbbb")
+        self.assertEqual(cache.get(A), b"aaaa")
+        cache.put(C, b"cccc")
+        self.assertNotIn(B, cache)
+        self.assertFalse(os.path.exists(os.path.join(self.directory.name, "bb", B)))
+        self.assertEqual(cache.disk.size, 8)
+        self.assertEqual(cache.statistics.disk_evictions, 1)
+
+    def test_tiles_of_the_wrong_size_are_evicted_as_misses(self):
+        cache = TileCache(0, self.directory.name)
+        cache.put(A, b"aaa")
+        self.assertIsNone(cache.get(A, 4))
+        self.assertNotIn(A, cache)
+        self.assertFalse(os.path.exists(os.path.join(self.directory.name, "aa", A)))
+        self.assertEqual(cache.statistics.misses, 1)
+
+    def test_the_disk_tier_only_picks_up_files_named_like_tiles(self):
+        TileCache(0, self.directory.name).put(A, b"aaaa")
+        shard = os.path.join(self.directory.name, "aa")
+        for path in (
+            os.path.join(shard, "notes.txt"),
+            os.path.join(shard, B),
+            os.path.join(self.directory.name, "other", A),
+        ):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as file:
+                file.write(b"data")
+        cache = TileCache(0, self.directory.name)
+        self.assertEqual(cache.disk.size, 4)
+        self.assertNotIn(B, cache)
+
+    def test_a_failed_write_leaves_no_partially_written_tile(self):
+        cache = TileCache(100, self.directory.name)
+        # A directory in the tile's place makes replacing it fail
+        os.makedirs(os.path.join(self.directory.name, "aa", A))
+        with self.assertRaises(OSError):
+            cache.put(A, b"aaaa")
+        self.assertEqual(os.listdir(os.path.join(self.directory.name, "aa")), [A])
+        self.assertEqual(cache.get(A), b"aaaa")
+
+    def test_the_disk_tier_removes_partially_written_tiles(self):
+        shard = os.path.join(self.directory.name, "aa")
+        os.makedirs(shard)
+        partial = os.path.join(shard, A + "x1y2z3.partial")
+        with open(partial, "wb") as file:
+            file.write(b"aa")
+        cache = TileCache(0, self.directory.name)
+        self.assertFalse(os.path.exists(partial))
+        self.assertEqual(cache.disk.size, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()